@@ -32,10 +32,25 @@ from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
 from sklearn.linear_model import LogisticRegression
 from sklearn.tree import DecisionTreeClassifier
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from joblib import Parallel, delayed
+import scipy.sparse as sp
+import contextlib
+import copy
+import functools
+import hashlib
+import json
+import os
+import time
+import tracemalloc
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 # Set plot style and parameters
 plt.style.use('seaborn-v0_8-whitegrid')
 sns.set_palette("viridis")
@@ -44,10 +59,261 @@ sns.set_palette("viridis")
 RANDOM_STATE = 42
 np.random.seed(RANDOM_STATE)
 
+"""# --- Instrumentation ---"""
+
+# --- Instrumentation ---
+# Set VERBOSE to False to silence the progress prints inside instrumented stages
+VERBOSE = True
+# Peak RSS is always recorded. tracemalloc additionally attributes Python/NumPy
+# allocations to stages but slows allocation-heavy code several-fold while
+# active, so it is opt-in and only runs inside stages
+TRACE_MEMORY = False
+
+# One record per completed stage, in completion order
+STAGE_METRICS = []
+_ACTIVE_STAGES = []
+
+
+def _current_rss_bytes():
+    """
+    Current resident set size of this process (Linux), or None if unavailable
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes():
+    """
+    High-water mark of the process resident set size, or None if unavailable
+
+    Uses VmHWM on Linux (resettable with _reset_peak_rss), else ru_maxrss.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def _reset_peak_rss():
+    """
+    Reset the process RSS high-water mark (Linux only); returns whether it worked
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _n_rows(obj):
+    """
+    Row count of a DataFrame/array-like (or the first element of a tuple), else None
+    """
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray)) or sp.issparse(obj):
+        return obj.shape[0]
+    return None
+
+
+@contextlib.contextmanager
+def stage(name, rows=None, **labels):
+    """
+    Record wall time, CPU time, peak memory and row count of a block of code
+
+    Usage:
+        with stage('fit', rows=len(X_train), model=name) as record:
+            ...
+
+    Extra keyword arguments are stored as labels (e.g. model name). The yielded
+    record can be updated inside the block, e.g. record['rows_out'] = len(result).
+    Progress prints inside the block are suppressed when VERBOSE is False.
+
+    cpu_seconds and rss_peak_bytes cover the main process only. rss_peak_bytes
+    is its peak RSS during the stage where the high-water mark can be reset
+    (Linux), otherwise the process-wide peak so far. Work done in worker
+    processes (e.g. the parallel bootstrap) is reported through
+    add_worker_usage as worker_cpu_seconds and worker_rss_peak_bytes. With
+    TRACE_MEMORY, tracemalloc runs only while stages are active and is stopped
+    again when the outermost stage exits.
+
+    Parameters:
+    -----------
+    name : str
+        Stage name
+    rows : int, optional
+        Number of input rows processed by the stage
+    """
+    record = {'stage': name, 'labels': labels, 'rows': rows}
+
+    # Fold the peaks so far into enclosing stages before resetting them
+    rss_peak = _peak_rss_bytes()
+    for parent in _ACTIVE_STAGES:
+        if parent['_rss_peak'] is not None and rss_peak is not None:
+            parent['_rss_peak'] = max(parent['_rss_peak'], rss_peak)
+    record['_rss_peak'] = _current_rss_bytes() if _reset_peak_rss() else None
+
+    record['_traced'] = TRACE_MEMORY
+    record['_started_tracing'] = False
+    if TRACE_MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            record['_started_tracing'] = True
+        current, peak = tracemalloc.get_traced_memory()
+        for parent in _ACTIVE_STAGES:
+            if parent['_traced']:
+                parent['_peak'] = max(parent['_peak'], peak)
+        tracemalloc.reset_peak()
+        record['_start_traced'] = current
+        record['_peak'] = current
+
+    _ACTIVE_STAGES.append(record)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    record['started_at'] = time.time()
+
+    with contextlib.ExitStack() as stack:
+        if not VERBOSE:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            _ACTIVE_STAGES.remove(record)
+
+            if record.pop('_traced'):
+                peak = tracemalloc.get_traced_memory()[1]
+                for active in _ACTIVE_STAGES + [record]:
+                    if '_peak' in active:
+                        active['_peak'] = max(active['_peak'], peak)
+                record['traced_peak_bytes'] = record.pop('_peak') - record.pop('_start_traced')
+                if record['_started_tracing']:
+                    tracemalloc.stop()
+            del record['_started_tracing']
+
+            rss_peak = _peak_rss_bytes()
+            for active in _ACTIVE_STAGES + [record]:
+                if active['_rss_peak'] is not None and rss_peak is not None:
+                    active['_rss_peak'] = max(active['_rss_peak'], rss_peak)
+            stage_peak = record.pop('_rss_peak')
+            record['rss_bytes'] = _current_rss_bytes()
+            record['rss_peak_bytes'] = stage_peak if stage_peak is not None else rss_peak
+            STAGE_METRICS.append(record)
+
+
+def add_worker_usage(cpu_seconds, rss_peak_bytes=None):
+    """
+    Attribute CPU time and peak RSS measured in a worker process to every
+    active stage (summing CPU time, keeping the largest per-worker peak)
+    """
+    for record in _ACTIVE_STAGES:
+        record['worker_cpu_seconds'] = record.get('worker_cpu_seconds', 0.0) + cpu_seconds
+        if rss_peak_bytes is not None:
+            record['worker_rss_peak_bytes'] = max(record.get('worker_rss_peak_bytes', 0),
+                                                  rss_peak_bytes)
+
+
+def instrumented(name=None):
+    """
+    Decorator running a function inside stage(), with row counts taken from
+    its first argument and its return value
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows = _n_rows(args[0]) if args else None
+            with stage(name or func.__name__, rows=rows) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = _n_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _prometheus_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def export_metrics(jsonl_path='pipeline_metrics.jsonl', prometheus_path='pipeline_metrics.prom'):
+    """
+    Write the recorded stage metrics as JSON lines and Prometheus text format
+
+    The JSON lines file has one record per stage execution. The Prometheus
+    file aggregates executions of the same stage and labels (times and rows
+    summed, memory peaks maxed) so each series appears once.
+
+    Parameters:
+    -----------
+    jsonl_path : str, optional
+        Output path for the JSON lines file (None to skip)
+    prometheus_path : str, optional
+        Output path for the Prometheus text file (None to skip)
+    """
+    if jsonl_path is not None:
+        with open(jsonl_path, 'w') as f:
+            for record in STAGE_METRICS:
+                f.write(json.dumps(record, default=str) + '\n')
+
+    if prometheus_path is not None:
+        metrics = [
+            ('pipeline_stage_calls_total', 'counter', 'Number of executions of the stage', None, 'sum'),
+            ('pipeline_stage_wall_seconds', 'gauge', 'Wall-clock time spent in the stage', 'wall_seconds', 'sum'),
+            ('pipeline_stage_cpu_seconds', 'gauge', 'CPU time of the main process in the stage (excludes worker processes)', 'cpu_seconds', 'sum'),
+            ('pipeline_stage_worker_cpu_seconds', 'gauge', 'CPU time of worker processes (e.g. parallel bootstrap) in the stage', 'worker_cpu_seconds', 'sum'),
+            ('pipeline_stage_rows', 'gauge', 'Input rows processed by the stage', 'rows', 'sum'),
+            ('pipeline_stage_traced_peak_bytes', 'gauge', 'Peak traced Python/NumPy allocations above the stage start', 'traced_peak_bytes', 'max'),
+            ('pipeline_stage_rss_peak_bytes', 'gauge', 'Peak resident set size of the main process during the stage', 'rss_peak_bytes', 'max'),
+            ('pipeline_stage_worker_rss_peak_bytes', 'gauge', 'Largest peak resident set size of a single worker process in the stage', 'worker_rss_peak_bytes', 'max'),
+        ]
+
+        # Group executions by stage name and labels
+        groups = {}
+        for record in STAGE_METRICS:
+            labels = {'stage': record['stage'], **record['labels']}
+            key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+            groups.setdefault(key, []).append(record)
+
+        lines = []
+        for metric, metric_type, help_text, field, agg in metrics:
+            samples = []
+            for key, records in groups.items():
+                if field is None:
+                    value = len(records)
+                else:
+                    values = [r.get(field) for r in records if r.get(field) is not None]
+                    if not values:
+                        continue
+                    value = sum(values) if agg == 'sum' else max(values)
+                label_str = ','.join(f'{k}="{_prometheus_label_value(v)}"' for k, v in key)
+                samples.append(f'{metric}{{{label_str}}} {value}')
+            if samples:
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} {metric_type}')
+                lines.extend(samples)
+
+        with open(prometheus_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
 """# --- Data Loading ---"""
 
 # --- Data Loading ---
 # Function to load data
+@instrumented()
 def load_dataset(url, sample_size=None):
     """
     Load the UCI Adult dataset from URL
@@ -176,6 +442,7 @@ df_train = load_dataset(train_url, sample_size=5000)
 """# --- Data Exploration ---"""
 
 # --- Data Exploration ---
+@instrumented()
 def explore_data(df):
     """
     Perform initial data exploration
@@ -278,6 +545,7 @@ if df_train is not None:
 """# --- Data Visualization ---"""
 
 # --- Data Visualization ---
+@instrumented()
 def create_visualizations(df):
     """
     Create visualizations for EDA - one by one to avoid overlapping
@@ -464,7 +732,148 @@ if df_train is not None:
 """# --- Data Preprocessing ---"""
 
 # --- Data Preprocessing ---
-def preprocess_data(df):
+# Pairwise crosses hashed by default when using the hashing encoder
+DEFAULT_HASH_CROSSES = [
+    ('native_country', 'occupation'),
+    ('native_country', 'education'),
+    ('occupation', 'education')
+]
+
+def _mix64(h):
+    """
+    splitmix64 finalizer: scrambles uint64 hashes so nearby inputs spread over all bits
+    """
+    with np.errstate(over='ignore'):
+        h = h ^ (h >> np.uint64(30))
+        h = h * np.uint64(0xbf58476d1ce4e5b9)
+        h = h ^ (h >> np.uint64(27))
+        h = h * np.uint64(0x94d049bb133111eb)
+        h = h ^ (h >> np.uint64(31))
+    return h
+
+
+def _name_salt(name):
+    """
+    Stable (process-independent) uint64 salt for a column or cross name
+    """
+    return np.uint64(int(hashlib.sha256(str(name).encode()).hexdigest()[:16], 16))
+
+
+# Hash given to missing values before column salting
+_MISSING_TOKEN = _name_salt('__missing__')
+
+
+class HashingCrossEncoder(BaseEstimator, TransformerMixin):
+    """
+    Hash categorical columns and pairwise crosses into a fixed-width sparse space
+
+    Drop-in replacement for the one-hot 'cat' branch of the preprocessor: the
+    output width is n_buckets regardless of how many categories are seen, and
+    the transform is stateless, so chunks can be encoded independently.
+    Missing values hash to their own token, so no imputer is needed.
+
+    Parameters:
+    -----------
+    n_buckets : int
+        Width of the output space
+    crosses : list of (str, str), optional
+        Pairs of columns whose combined value is hashed as an extra token;
+        pairs referring to absent columns are skipped
+    alternate_sign : bool
+        Give each token a hash-derived sign so collisions tend to cancel
+        rather than accumulate
+    """
+
+    def __init__(self, n_buckets=2**12, crosses=None, alternate_sign=True):
+        self.n_buckets = n_buckets
+        self.crosses = crosses
+        self.alternate_sign = alternate_sign
+
+    def _columns(self, X):
+        if isinstance(X, pd.DataFrame):
+            return [str(col) for col in X.columns]
+        return [f'x{i}' for i in range(np.asarray(X).shape[1])]
+
+    def _tokens(self, X):
+        """
+        Return the (n_samples, n_tokens) uint64 token hashes for X
+        """
+        columns = self._columns(X)
+        values = X.to_numpy(dtype=object) if isinstance(X, pd.DataFrame) else np.asarray(X, dtype=object)
+
+        tokens = {}
+        for j, col in enumerate(columns):
+            # hash_array factorizes first, so this is one vectorized pass per column
+            hashed = pd.util.hash_array(values[:, j], categorize=True)
+            # None/NaN share one dedicated token, distinct from any string such as 'nan'
+            hashed[pd.isna(values[:, j])] = _MISSING_TOKEN
+            tokens[col] = _mix64(hashed ^ _name_salt(col))
+
+        crossed = []
+        for a, b in (self.crosses or []):
+            if a in tokens and b in tokens:
+                with np.errstate(over='ignore'):
+                    crossed.append(_mix64(tokens[a] ^ _mix64(tokens[b] + _name_salt(f'{a}*{b}'))))
+
+        return np.column_stack([tokens[col] for col in columns] + crossed)
+
+    def fit(self, X, y=None):
+        """
+        Record input columns and a collision report for the training data
+        """
+        self.feature_names_in_ = np.array(self._columns(X), dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.collision_report_ = self.collision_report(X)
+        return self
+
+    def transform(self, X):
+        """
+        Encode X as a CSR matrix of shape (n_samples, n_buckets)
+        """
+        tokens = self._tokens(X)
+        n_samples, n_tokens = tokens.shape
+
+        indices = (tokens % np.uint64(self.n_buckets)).astype(np.int64).ravel()
+        if self.alternate_sign:
+            data = np.where((tokens >> np.uint64(63)).astype(bool), -1.0, 1.0).ravel()
+        else:
+            data = np.ones(n_samples * n_tokens)
+        indptr = np.arange(0, n_samples * n_tokens + 1, n_tokens)
+
+        encoded = sp.csr_matrix((data, indices, indptr), shape=(n_samples, self.n_buckets))
+        encoded.sum_duplicates()
+        return encoded
+
+    def collision_report(self, X):
+        """
+        Measure how many distinct tokens in X share a bucket with another token
+
+        Returns:
+        --------
+        dict
+            'n_tokens' distinct values and crosses seen, 'n_buckets_used',
+            'collision_rate' (fraction of tokens sharing a bucket) and
+            'expected_collision_rate' for uniformly random hashing
+        """
+        unique_tokens = np.unique(self._tokens(X))
+        buckets, counts = np.unique(unique_tokens % np.uint64(self.n_buckets), return_counts=True)
+        n_tokens = len(unique_tokens)
+        colliding = int(counts[counts > 1].sum())
+
+        return {
+            'n_tokens': n_tokens,
+            'n_buckets': self.n_buckets,
+            'n_buckets_used': len(buckets),
+            'collision_rate': colliding / n_tokens if n_tokens else 0.0,
+            'expected_collision_rate': 1 - (1 - 1 / self.n_buckets) ** max(n_tokens - 1, 0)
+        }
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array([f'hash_{i}' for i in range(self.n_buckets)], dtype=object)
+
+@instrumented()
+def preprocess_data(df, encoding='onehot', hash_buckets=2**12, hash_crosses=None,
+                    set_aside_fnlwgt=False):
     """
     Preprocess the data for modeling
 
@@ -472,6 +881,16 @@ def preprocess_data(df):
     -----------
     df : pd.DataFrame
         Dataset to preprocess
+    encoding : str
+        'onehot' for one-hot categoricals, or 'hashing' to hash categoricals
+        and pairwise crosses into a fixed number of buckets
+    hash_buckets : int
+        Output width of the hashing encoder
+    hash_crosses : list of (str, str), optional
+        Pairwise crosses for the hashing encoder; defaults to DEFAULT_HASH_CROSSES
+    set_aside_fnlwgt : bool
+        Leave the 'fnlwgt' sampling weight out of the model features (it stays
+        in X so it can still be used as a survey weight)
 
     Returns:
     --------
@@ -518,16 +937,29 @@ def preprocess_data(df):
     numerical_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
     categorical_cols = X.select_dtypes(include=['object']).columns.tolist()
 
+    if set_aside_fnlwgt and 'fnlwgt' in numerical_cols:
+        numerical_cols.remove('fnlwgt')
+
     # Create preprocessing pipelines
     numerical_transformer = Pipeline(steps=[
         ('imputer', SimpleImputer(strategy='median')),
         ('scaler', StandardScaler())
     ])
 
-    categorical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='most_frequent')),
-        ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
-    ])
+    if encoding == 'onehot':
+        categorical_transformer = Pipeline(steps=[
+            ('imputer', SimpleImputer(strategy='most_frequent')),
+            ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
+        ])
+    elif encoding == 'hashing':
+        categorical_transformer = Pipeline(steps=[
+            ('hashing', HashingCrossEncoder(
+                n_buckets=hash_buckets,
+                crosses=DEFAULT_HASH_CROSSES if hash_crosses is None else hash_crosses
+            ))
+        ])
+    else:
+        raise ValueError(f"Unknown encoding '{encoding}'. Use 'onehot' or 'hashing'.")
 
     # Combine preprocessing steps
     preprocessor = ColumnTransformer(
@@ -539,10 +971,667 @@ def preprocess_data(df):
 
     return X, y, preprocessor
 
+"""# --- Feature Store ---"""
+
+# --- Feature Store ---
+FEATURE_STORE_VERSION = 1
+
+def _file_sha256(path, chunk_size=1 << 20):
+    """
+    Hash a file in fixed-size chunks so large matrices are never fully loaded
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_inputs(X, y, preprocessor, test_size=0.2):
+    """
+    Fingerprint the raw inputs a feature store is built from
+
+    Hashes the raw feature rows, the labels, the preprocessor parameters and
+    the split settings, so a store built from different data or a differently
+    configured preprocessor can be told apart even when the output schema is
+    the same.
+
+    Parameters:
+    -----------
+    X : pd.DataFrame
+        Raw features
+    y : pd.Series
+        Target variable
+    preprocessor : ColumnTransformer
+        Preprocessor (fitted or not; only its parameters are used)
+    test_size : float
+        Fraction of rows held out for testing
+
+    Returns:
+    --------
+    str
+        Hex sha256 digest
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(X, index=True).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(pd.Series(np.asarray(y)), index=False).to_numpy().tobytes())
+    params = preprocessor.get_params(deep=True)
+    digest.update(repr(sorted((key, repr(value)) for key, value in params.items())).encode())
+    digest.update(repr((test_size, RANDOM_STATE)).encode())
+    return digest.hexdigest()
+
+
+def write_feature_store(path, X_train, X_test, y_train, y_test, feature_names,
+                        input_fingerprint=None):
+    """
+    Write transformed train/test matrices, labels and metadata to disk once
+
+    Dense matrices are stored as .npy files and sparse matrices as CSR
+    indptr/indices/data arrays, so worker processes can memory-map them instead
+    of receiving a pickled copy each. The manifest is written last, so a store
+    interrupted mid-write has no manifest and is rejected on open.
+
+    Parameters:
+    -----------
+    path : str
+        Directory for the store (created if missing)
+    X_train, X_test : np.ndarray or scipy.sparse matrix
+        Transformed design matrices
+    y_train, y_test : array-like
+        Target labels
+    feature_names : array-like
+        Names of the transformed features
+    input_fingerprint : str, optional
+        Fingerprint of the raw inputs (see fingerprint_inputs)
+
+    Returns:
+    --------
+    dict
+        The manifest that was written
+    """
+    os.makedirs(path, exist_ok=True)
+    feature_names = [str(name) for name in feature_names]
+
+    # Remove any previous manifest first so a partial rewrite cannot look valid
+    manifest_path = os.path.join(path, 'manifest.json')
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    manifest = {
+        'version': FEATURE_STORE_VERSION,
+        'feature_names': feature_names,
+        'schema_hash': hashlib.sha256('\n'.join(feature_names).encode()).hexdigest(),
+        'input_fingerprint': input_fingerprint,
+        'matrices': {},
+        'arrays': {}
+    }
+
+    def save_array(name, array):
+        array = np.ascontiguousarray(array)
+        file_name = f'{name}.npy'
+        np.save(os.path.join(path, file_name), array)
+        manifest['arrays'][name] = {
+            'file': file_name,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'bytes': os.path.getsize(os.path.join(path, file_name)),
+            'sha256': _file_sha256(os.path.join(path, file_name))
+        }
+
+    for split, matrix in [('X_train', X_train), ('X_test', X_test)]:
+        if matrix.shape[1] != len(feature_names):
+            raise ValueError(f"{split} has {matrix.shape[1]} columns but "
+                             f"{len(feature_names)} feature names were given.")
+        if sp.issparse(matrix):
+            matrix = sp.csr_matrix(matrix)
+            matrix.sort_indices()
+            for part in ['indptr', 'indices', 'data']:
+                save_array(f'{split}_{part}', getattr(matrix, part))
+            manifest['matrices'][split] = {'format': 'csr', 'shape': list(matrix.shape),
+                                           'dtype': matrix.dtype.str}
+        else:
+            matrix = np.asarray(matrix)
+            save_array(split, matrix)
+            manifest['matrices'][split] = {'format': 'dense', 'shape': list(matrix.shape),
+                                           'dtype': matrix.dtype.str}
+
+    save_array('y_train', np.asarray(y_train))
+    save_array('y_test', np.asarray(y_test))
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Feature store written to {path}: "
+          f"{manifest['matrices']['X_train']['shape']} train, "
+          f"{manifest['matrices']['X_test']['shape']} test "
+          f"({manifest['matrices']['X_train']['format']})")
+
+    return manifest
+
+
+def open_feature_store(path, feature_names=None, input_fingerprint=None, verify_hashes=False):
+    """
+    Open a feature store with zero-copy memory-mapped reads
+
+    Parameters:
+    -----------
+    path : str
+        Directory written by write_feature_store
+    feature_names : array-like, optional
+        Expected feature names; the store is rejected if its schema differs
+    input_fingerprint : str, optional
+        Fingerprint of the caller's raw inputs (see fingerprint_inputs); the
+        store is rejected if it was built from different inputs
+    verify_hashes : bool
+        Re-hash every file against the manifest (reads the files once); by
+        default only dtypes, shapes and file sizes are checked
+
+    Returns:
+    --------
+    dict
+        'X_train', 'X_test' (np.memmap or CSR over memmaps), 'y_train',
+        'y_test', 'feature_names' and 'manifest'
+    """
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No feature store manifest found in {path}.")
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get('version') != FEATURE_STORE_VERSION:
+        raise ValueError(f"Feature store version {manifest.get('version')} does not match "
+                         f"expected version {FEATURE_STORE_VERSION}.")
+
+    if feature_names is not None:
+        expected = [str(name) for name in feature_names]
+        if hashlib.sha256('\n'.join(expected).encode()).hexdigest() != manifest['schema_hash']:
+            raise ValueError("Feature store schema does not match the expected feature names. "
+                             "The store is stale and must be rebuilt.")
+
+    if input_fingerprint is not None and manifest.get('input_fingerprint') != input_fingerprint:
+        raise ValueError("Feature store was built from different inputs or preprocessor settings. "
+                         "The store is stale and must be rebuilt.")
+
+    arrays = {}
+    for name, meta in manifest['arrays'].items():
+        file_path = os.path.join(path, meta['file'])
+        if not os.path.exists(file_path):
+            raise ValueError(f"Feature store file missing: {meta['file']}")
+        if os.path.getsize(file_path) != meta['bytes']:
+            raise ValueError(f"{meta['file']} is {os.path.getsize(file_path)} bytes, manifest "
+                             f"expects {meta['bytes']}. The store is stale and must be rebuilt.")
+        if verify_hashes and _file_sha256(file_path) != meta['sha256']:
+            raise ValueError(f"Hash mismatch for {meta['file']}. The store is stale and must be rebuilt.")
+
+        array = np.load(file_path, mmap_mode='r')
+        if array.dtype.str != meta['dtype'] or list(array.shape) != meta['shape']:
+            raise ValueError(f"{meta['file']} has dtype {array.dtype.str} and shape {list(array.shape)}, "
+                             f"manifest expects {meta['dtype']} and {meta['shape']}.")
+        arrays[name] = array
+
+    store = {'feature_names': manifest['feature_names'], 'manifest': manifest}
+    for split, meta in manifest['matrices'].items():
+        if meta['format'] == 'csr':
+            store[split] = sp.csr_matrix(
+                (arrays[f'{split}_data'], arrays[f'{split}_indices'], arrays[f'{split}_indptr']),
+                shape=tuple(meta['shape']), copy=False
+            )
+        else:
+            store[split] = arrays[split]
+    store['y_train'] = arrays['y_train']
+    store['y_test'] = arrays['y_test']
+
+    return store
+
+
+def build_feature_store(X, y, preprocessor, path, test_size=0.2):
+    """
+    Fit the preprocessor on the training split and persist the transformed data
+
+    Uses the same stratified split as train_and_evaluate_models. The manifest
+    records fingerprint_inputs(X, y, preprocessor, test_size), which workers
+    can pass to open_feature_store to reject a store built from other inputs.
+
+    Parameters:
+    -----------
+    X : pd.DataFrame
+        Features
+    y : pd.Series
+        Target variable
+    preprocessor : ColumnTransformer
+        Unfitted preprocessor from preprocess_data
+    path : str
+        Directory for the store
+    test_size : float
+        Fraction of rows held out for testing
+
+    Returns:
+    --------
+    dict
+        The manifest that was written
+    """
+    input_fingerprint = fingerprint_inputs(X, y, preprocessor, test_size)
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=RANDOM_STATE, stratify=y
+    )
+
+    X_train_t = preprocessor.fit_transform(X_train)
+    X_test_t = preprocessor.transform(X_test)
+
+    return write_feature_store(path, X_train_t, X_test_t, y_train, y_test,
+                               preprocessor.get_feature_names_out(),
+                               input_fingerprint=input_fingerprint)
+
+"""# --- Duplicate Collapsing ---"""
+
+# --- Duplicate Collapsing ---
+def _row_hashes(X_encoded, y):
+    """
+    64-bit hash of every row of an encoded matrix together with its label
+
+    Sparse input must be canonical CSR (duplicates summed, explicit zeros
+    removed) so equal rows have equal stored entries; it is only read.
+    """
+    y_hash = _mix64(pd.util.hash_array(np.asarray(y)))
+
+    if sp.issparse(X_encoded):
+        # Order-independent sum of per-entry hashes of (column, value)
+        with np.errstate(over='ignore'):
+            entry = _mix64(X_encoded.indices.astype(np.uint64)
+                           ^ _mix64(pd.util.hash_array(X_encoded.data)))
+            row_ids = np.repeat(np.arange(X_encoded.shape[0]), np.diff(X_encoded.indptr))
+            hashes = np.zeros(X_encoded.shape[0], dtype=np.uint64)
+            np.add.at(hashes, row_ids, entry)
+    else:
+        X_encoded = np.asarray(X_encoded)
+        hashes = np.zeros(X_encoded.shape[0], dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for j in range(X_encoded.shape[1]):
+                hashes = _mix64(hashes ^ pd.util.hash_array(X_encoded[:, j]))
+
+    return _mix64(hashes ^ y_hash)
+
+
+def collapse_duplicates(X_encoded, y, sample_weight=None):
+    """
+    Collapse identical encoded rows (with identical labels) into weighted unique rows
+
+    Every duplicate contributes the same term to the loss and split criteria, so
+    fitting on the unique rows with their summed weights gives the same
+    LogisticRegression as fitting on all rows. The same holds for
+    DecisionTreeClassifier only while min_samples_split and min_samples_leaf
+    stay at their defaults, since those count unweighted rows; express such
+    limits through min_weight_fraction_leaf instead when fitting collapsed rows.
+
+    Parameters:
+    -----------
+    X_encoded : np.ndarray or scipy.sparse matrix
+        Encoded feature matrix (output of the fitted preprocessor)
+    y : array-like
+        Target labels
+    sample_weight : array-like, optional
+        Per-row weights (e.g. survey weights) summed within each group;
+        defaults to 1 so the result is the multiplicity count
+
+    Returns:
+    --------
+    X_unique : np.ndarray or scipy.sparse matrix
+        One representative row per group
+    y_unique : np.ndarray
+        Label of each group
+    weights : np.ndarray
+        Summed weight of each group
+    """
+    y = np.asarray(y)
+    if sample_weight is None:
+        sample_weight = np.ones(len(y))
+
+    if sp.issparse(X_encoded):
+        # Canonicalize a copy; sum_duplicates/eliminate_zeros work in place and
+        # must not rewrite the caller's arrays
+        X_rows = sp.csr_matrix(X_encoded, copy=True)
+        X_rows.sum_duplicates()
+        X_rows.eliminate_zeros()
+    else:
+        X_rows = np.asarray(X_encoded)
+
+    codes = pd.factorize(_row_hashes(X_rows, y))[0]
+    first = np.unique(codes, return_index=True)[1]
+
+    # Guard against 64-bit hash collisions: every row must equal its representative
+    representative = first[codes]
+    if sp.issparse(X_rows):
+        mismatch = (X_rows - X_rows[representative]).count_nonzero() > 0
+    else:
+        mismatch = not np.array_equal(X_rows, X_rows[representative])
+    if mismatch or not np.array_equal(y, y[representative]):
+        print("Row hash collision detected; falling back to exact row comparison")
+        dense = X_rows.toarray() if sp.issparse(X_rows) else X_rows
+        keyed = np.column_stack([dense, y])
+        _, first, codes = np.unique(keyed, axis=0, return_index=True, return_inverse=True)
+        codes = codes.ravel()
+
+    weights = np.bincount(codes, weights=sample_weight, minlength=len(first))
+
+    print(f"Collapsed {len(y)} training rows into {len(first)} unique rows "
+          f"({100 * (1 - len(first) / len(y)):.1f}% reduction)")
+
+    return X_rows[first], y[first], weights
+
+"""# --- Model Evaluation ---"""
+
+# --- Model Evaluation ---
+def sweep_thresholds(y_true, y_score):
+    """
+    Derive confusion matrices, ROC and PR curves at every threshold from a single sort
+
+    Scores are sorted once in descending order and the true/false positive counts
+    at every distinct score are read off the cumulative label sums, so the whole
+    sweep costs one O(n log n) sort instead of one pass per metric per threshold.
+
+    Parameters:
+    -----------
+    y_true : array-like
+        Binary target labels (0/1)
+    y_score : array-like
+        Predicted probability (or score) of the positive class
+
+    Returns:
+    --------
+    dict
+        'thresholds' (distinct scores, descending) and the cumulative 'tp'/'fp'
+        counts when predicting positive for score >= threshold, plus
+        'y_sorted' and 'distinct_idx' for reuse by the bootstrap
+    """
+    y_true = np.asarray(y_true).astype(np.int8).ravel()
+    y_score = np.asarray(y_score, dtype=np.float64).ravel()
+
+    if y_true.shape != y_score.shape:
+        raise ValueError("y_true and y_score must have the same length.")
+
+    # Sort once; mergesort keeps tied scores in a deterministic order
+    order = np.argsort(-y_score, kind='mergesort')
+    y_sorted = y_true[order]
+    score_sorted = y_score[order]
+
+    # Last position of each run of tied scores
+    distinct_idx = np.r_[np.flatnonzero(np.diff(score_sorted)), len(score_sorted) - 1]
+
+    tp = np.cumsum(y_sorted, dtype=np.int64)[distinct_idx]
+    fp = (distinct_idx + 1) - tp
+
+    return {
+        'thresholds': score_sorted[distinct_idx],
+        'tp': tp,
+        'fp': fp,
+        'y_sorted': y_sorted,
+        'distinct_idx': distinct_idx
+    }
+
+
+def _curve_metrics(tp, fp, k):
+    """
+    Compute curve and operating-point metrics from cumulative counts
+
+    Parameters:
+    -----------
+    tp, fp : np.ndarray
+        Cumulative true/false positive counts, shape (n_rows, n_thresholds)
+    k : int
+        Number of distinct thresholds strictly above the operating threshold
+
+    Returns:
+    --------
+    dict
+        Metric name -> array of shape (n_rows,)
+    """
+    tp = np.atleast_2d(tp)
+    fp = np.atleast_2d(fp)
+    n_pos = tp[:, -1].astype(np.float64)
+    n_neg = fp[:, -1].astype(np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Per-threshold increments, starting from the (0, 0) corner
+        dtp = np.diff(tp, axis=1, prepend=0).astype(np.float64)
+        dfp = np.diff(fp, axis=1, prepend=0).astype(np.float64)
+
+        # ROC AUC by the trapezoidal rule on counts: sum(dfp * (tp_k + tp_{k-1})) / (2 P N)
+        roc_auc = np.einsum('ij,ij->i', dfp, 2 * tp - dtp) / (2 * n_pos * n_neg)
+        del dfp
+
+        # Average precision as the step-wise area under the PR curve: sum(dtp * precision) / P
+        total = (tp + fp).astype(np.float64)
+        np.divide(tp, total, out=total, where=total > 0)
+        average_precision = np.einsum('ij,ij->i', dtp, total) / n_pos
+        del dtp, total
+
+        # Operating point: predict positive when score > threshold
+        tp_k = tp[:, k - 1].astype(np.float64) if k > 0 else np.zeros(len(tp))
+        fp_k = fp[:, k - 1].astype(np.float64) if k > 0 else np.zeros(len(fp))
+        op_precision = np.where(tp_k + fp_k > 0, tp_k / (tp_k + fp_k), 0.0)
+        op_recall = tp_k / n_pos
+        f1 = np.where(op_precision + op_recall > 0,
+                      2 * op_precision * op_recall / (op_precision + op_recall), 0.0)
+        accuracy = (tp_k + n_neg - fp_k) / (n_pos + n_neg)
+
+    return {
+        'accuracy': accuracy,
+        'precision': op_precision,
+        'recall': op_recall,
+        'f1': f1,
+        'roc_auc': roc_auc,
+        'average_precision': average_precision
+    }
+
+
+def _bootstrap_batch(y_sorted, distinct_idx, k, n_resamples, seed, parent_pid=None):
+    """
+    Evaluate one batch of bootstrap resamples as a single matrix operation
+
+    Each resample is drawn as a row of resampled indices and turned into per-row
+    multiplicity counts, so the cumulative counts of all resamples in the batch
+    come from one cumsum over the already-sorted labels. Counts are int32 and
+    the cumsums run in place, so the batch holds two int32 count matrices.
+
+    Returns:
+    --------
+    metrics : dict
+        Metric name -> array of shape (n_resamples,)
+    usage : dict
+        'cpu_seconds' and 'rss_peak_bytes' of the batch when it ran in a worker
+        process other than parent_pid, else None (already counted by the caller)
+    """
+    in_worker = parent_pid is not None and os.getpid() != parent_pid
+    if in_worker:
+        cpu_start = time.process_time()
+        _reset_peak_rss()
+
+    rng = np.random.default_rng(seed)
+    n = len(y_sorted)
+
+    # Resampled indices -> multiplicity of each sorted row in each resample
+    counts = np.empty((n_resamples, n), dtype=np.int32)
+    for row in range(n_resamples):
+        counts[row] = np.bincount(rng.integers(0, n, size=n), minlength=n)
+
+    positives = counts * y_sorted.astype(np.int32)
+    np.cumsum(positives, axis=1, out=positives)
+    np.cumsum(counts, axis=1, out=counts)
+
+    tp = positives[:, distinct_idx]
+    del positives
+    fp = counts[:, distinct_idx] - tp
+    del counts
+
+    metrics = _curve_metrics(tp, fp, k)
+    usage = None
+    if in_worker:
+        usage = {'cpu_seconds': time.process_time() - cpu_start,
+                 'rss_peak_bytes': _peak_rss_bytes()}
+    return metrics, usage
+
+
+def bootstrap_confidence_intervals(sweep, threshold=0.5, n_bootstrap=1000,
+                                   confidence_level=0.95, n_jobs=-1,
+                                   batch_size=None, random_state=RANDOM_STATE):
+    """
+    Percentile bootstrap confidence intervals for the evaluation metrics
+
+    Parameters:
+    -----------
+    sweep : dict
+        Output of sweep_thresholds
+    threshold : float
+        Operating threshold for accuracy/precision/recall/F1
+    n_bootstrap : int
+        Number of bootstrap resamples
+    confidence_level : float
+        Coverage of the intervals (e.g. 0.95)
+    n_jobs : int
+        Number of worker processes (-1 uses all cores)
+    batch_size : int, optional
+        Resamples evaluated per vectorized batch; each batch uses roughly
+        50 bytes per (resample, row) entry per worker. If None, sized to keep
+        each count matrix around 1M entries
+    random_state : int
+        Seed for the resampling
+
+    Returns:
+    --------
+    dict
+        Metric name -> (lower, upper)
+    """
+    y_sorted = sweep['y_sorted']
+    distinct_idx = sweep['distinct_idx']
+    k = int(np.searchsorted(-sweep['thresholds'], -threshold, side='left'))
+
+    if batch_size is None:
+        batch_size = max(1, (1 << 20) // max(1, len(y_sorted)))
+    batch_sizes = [min(batch_size, n_bootstrap - start)
+                   for start in range(0, n_bootstrap, batch_size)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(batch_sizes))
+
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_bootstrap_batch)(y_sorted, distinct_idx, k, size, seed, os.getpid())
+        for size, seed in zip(batch_sizes, seeds)
+    )
+    batches = [metrics for metrics, _ in outputs]
+
+    # Report CPU/memory spent in worker processes to the enclosing stages
+    for _, usage in outputs:
+        if usage is not None:
+            add_worker_usage(usage['cpu_seconds'], usage['rss_peak_bytes'])
+
+    alpha = (1 - confidence_level) / 2
+    intervals = {}
+    for metric in batches[0]:
+        values = np.concatenate([batch[metric] for batch in batches])
+        low, high = np.nanpercentile(values, [100 * alpha, 100 * (1 - alpha)])
+        intervals[metric] = (float(low), float(high))
+
+    return intervals
+
+
+def evaluate_classifier(y_true, y_score, threshold=0.5, n_bootstrap=1000,
+                        confidence_level=0.95, n_jobs=-1, batch_size=None,
+                        random_state=RANDOM_STATE):
+    """
+    Evaluate a binary classifier from its scores in one sorted pass
+
+    Parameters:
+    -----------
+    y_true : array-like
+        Binary target labels (0/1)
+    y_score : array-like
+        Predicted probability of the positive class
+    threshold : float
+        Operating threshold; a sample is predicted positive when score > threshold,
+        matching predict() for probability outputs
+    n_bootstrap : int
+        Number of bootstrap resamples for the confidence intervals (0 to skip)
+    confidence_level : float
+        Coverage of the bootstrap intervals
+    n_jobs : int
+        Number of worker processes for the bootstrap
+    batch_size : int, optional
+        Resamples per vectorized bootstrap batch (see bootstrap_confidence_intervals)
+    random_state : int
+        Seed for the bootstrap
+
+    Returns:
+    --------
+    dict
+        Structured results: point metrics, 'confusion_matrix',
+        'classification_report' (per-class dict), 'roc_curve', 'pr_curve'
+        and 'confidence_intervals'
+    """
+    sweep = sweep_thresholds(y_true, y_score)
+    thresholds, tp, fp = sweep['thresholds'], sweep['tp'], sweep['fp']
+    n_pos, n_neg = int(tp[-1]), int(fp[-1])
+
+    k = int(np.searchsorted(-thresholds, -threshold, side='left'))
+    metrics = {name: float(value[0]) for name, value in _curve_metrics(tp, fp, k).items()}
+
+    # Confusion matrix at the operating threshold, sklearn layout [[tn, fp], [fn, tp]]
+    tp_k = int(tp[k - 1]) if k > 0 else 0
+    fp_k = int(fp[k - 1]) if k > 0 else 0
+    tn_k, fn_k = n_neg - fp_k, n_pos - tp_k
+    conf_matrix = np.array([[tn_k, fp_k], [fn_k, tp_k]])
+
+    # Per-class report, the structured equivalent of classification_report
+    npv = tn_k / (tn_k + fn_k) if tn_k + fn_k > 0 else 0.0
+    specificity = tn_k / n_neg if n_neg > 0 else 0.0
+    report = {
+        0: {
+            'precision': npv,
+            'recall': specificity,
+            'f1': 2 * npv * specificity / (npv + specificity) if npv + specificity > 0 else 0.0,
+            'support': n_neg
+        },
+        1: {
+            'precision': metrics['precision'],
+            'recall': metrics['recall'],
+            'f1': metrics['f1'],
+            'support': n_pos
+        }
+    }
+
+    # Full curves at every distinct threshold, starting from the (0, 0) corner
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = np.r_[0.0, tp / n_pos]
+        fpr = np.r_[0.0, fp / n_neg]
+        precision = np.r_[1.0, tp / (tp + fp)]
+    all_thresholds = np.r_[np.inf, thresholds]
+
+    results = {
+        **metrics,
+        'threshold': threshold,
+        'confusion_matrix': conf_matrix,
+        'classification_report': report,
+        'roc_curve': {'fpr': fpr, 'tpr': tpr, 'thresholds': all_thresholds},
+        'pr_curve': {'precision': precision, 'recall': tpr, 'thresholds': all_thresholds},
+        'confusion_matrices': {'thresholds': thresholds, 'tp': tp, 'fp': fp,
+                               'tn': n_neg - fp, 'fn': n_pos - tp},
+        'confidence_intervals': {}
+    }
+
+    if n_bootstrap > 0:
+        results['confidence_intervals'] = bootstrap_confidence_intervals(
+            sweep, threshold=threshold, n_bootstrap=n_bootstrap,
+            confidence_level=confidence_level, n_jobs=n_jobs,
+            batch_size=batch_size, random_state=random_state
+        )
+
+    return results
+
 """# --- Model Training and Evaluation ---"""
 
 # --- Model Training and Evaluation ---
-def train_and_evaluate_models(X, y, preprocessor):
+@instrumented()
+def train_and_evaluate_models(X, y, preprocessor, n_bootstrap=1000, n_jobs=-1,
+                              batch_size=None, dedupe=False, survey_weight=None):
     """
     Train and evaluate multiple models
 
@@ -554,6 +1643,18 @@ def train_and_evaluate_models(X, y, preprocessor):
         Target variable
     preprocessor : ColumnTransformer
         Preprocessor for the data
+    n_bootstrap : int
+        Number of bootstrap resamples for the metric confidence intervals
+    n_jobs : int
+        Number of worker processes for the bootstrap (-1 uses all cores)
+    batch_size : int, optional
+        Resamples per vectorized bootstrap batch, to bound memory per worker
+    dedupe : bool
+        Fit the classifiers on unique encoded training rows weighted by their
+        multiplicity instead of on every duplicate (see collapse_duplicates)
+    survey_weight : str, optional
+        Column of X (e.g. 'fnlwgt') used as a per-row sample weight, normalized
+        to mean 1; it should be excluded from the preprocessor's features
 
     Returns:
     --------
@@ -592,31 +1693,53 @@ def train_and_evaluate_models(X, y, preprocessor):
         ])
     }
 
+    # Optional survey weights, normalized so the total weight equals the row count
+    weights = None
+    if survey_weight is not None:
+        weights = X_train[survey_weight].to_numpy(dtype=np.float64)
+        weights = weights / weights.mean()
+
+    # Both pipelines share the preprocessor, so with dedupe it is fitted once
+    # on all training rows and the classifiers see only the unique encoded rows
+    if dedupe:
+        with stage('preprocessor_fit_transform', rows=len(X_train)):
+            X_train_encoded = preprocessor.fit_transform(X_train)
+        with stage('collapse_duplicates', rows=len(X_train)) as record:
+            X_unique, y_unique, w_unique = collapse_duplicates(X_train_encoded, y_train, weights)
+            record['rows_out'] = len(y_unique)
+
     # Train and evaluate models
     results = {}
     for name, model in models.items():
         print(f"\n=== Training {name} ===")
-        model.fit(X_train, y_train)
-
-        # Evaluate on test set
-        y_pred = model.predict(X_test)
-
-        # Calculate metrics
-        accuracy = accuracy_score(y_test, y_pred)
-        report = classification_report(y_test, y_pred)
-        conf_matrix = confusion_matrix(y_test, y_pred)
+        with stage('fit', rows=len(y_unique) if dedupe else len(X_train), model=name):
+            if dedupe:
+                model.named_steps['classifier'].fit(X_unique, y_unique, sample_weight=w_unique)
+            elif weights is not None:
+                model.fit(X_train, y_train, classifier__sample_weight=weights)
+            else:
+                model.fit(X_train, y_train)
 
-        # Store results
-        results[name] = {
-            'accuracy': accuracy,
-            'classification_report': report,
-            'confusion_matrix': conf_matrix
-        }
+        # Evaluate on test set at every threshold from one sort of the scores
+        with stage('predict', rows=len(X_test), model=name):
+            y_score = model.predict_proba(X_test)[:, 1]
+        with stage('evaluate', rows=len(X_test), model=name):
+            results[name] = evaluate_classifier(y_test, y_score, n_bootstrap=n_bootstrap,
+                                                n_jobs=n_jobs, batch_size=batch_size)
+        conf_matrix = results[name]['confusion_matrix']
+        intervals = results[name]['confidence_intervals']
 
         # Display results
-        print(f"Accuracy: {accuracy:.4f}")
+        print(f"Accuracy: {results[name]['accuracy']:.4f}")
+        print("\nMetrics (with bootstrap confidence intervals):")
+        for metric in ['accuracy', 'precision', 'recall', 'f1', 'roc_auc', 'average_precision']:
+            line = f"  {metric:<18} {results[name][metric]:.4f}"
+            if metric in intervals:
+                low, high = intervals[metric]
+                line += f"  [{low:.4f}, {high:.4f}]"
+            print(line)
         print("\nClassification Report:")
-        print(report)
+        print(pd.DataFrame(results[name]['classification_report']).T.round(4))
         print("\nConfusion Matrix:")
         print(conf_matrix)
 
@@ -639,9 +1762,296 @@ if df_train is not None:
     X, y, preprocessor = preprocess_data(df_train)
     models, results = train_and_evaluate_models(X, y, preprocessor)
 
+"""# --- Incremental Retraining ---"""
+
+# --- Incremental Retraining ---
+def create_retrain_state(X, y, replay_size=5000, holdout_size=2000):
+    """
+    Initialize the replay sample and rolling holdout used by incremental_retrain
+
+    Reproduces the train/test split of train_and_evaluate_models, keeps a
+    uniform sample of the training rows for replay and the last holdout_size
+    test rows as the initial holdout window.
+
+    Parameters:
+    -----------
+    X : pd.DataFrame
+        Features the current models were trained on
+    y : pd.Series
+        Target variable
+    replay_size : int
+        Maximum number of historical rows replayed at each retrain
+    holdout_size : int
+        Size of the rolling holdout window
+
+    Returns:
+    --------
+    dict
+        Retraining state
+    """
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=RANDOM_STATE, stratify=y
+    )
+    replay_idx = np.random.default_rng(RANDOM_STATE).permutation(len(X_train))[:replay_size]
+
+    return {
+        'version': 1,
+        'latest_version': 1,
+        'n_seen': len(X_train),
+        'replay_size': replay_size,
+        'holdout_size': holdout_size,
+        'replay_X': X_train.iloc[replay_idx],
+        'replay_y': y_train.iloc[replay_idx],
+        'holdout_X': X_test.iloc[-holdout_size:],
+        'holdout_y': y_test.iloc[-holdout_size:],
+        # Running category counts, so most-frequent fill values can be updated
+        'category_counts': {col: X_train[col].value_counts()
+                            for col in X_train.select_dtypes(include=['object']).columns},
+        'rng': np.random.default_rng(RANDOM_STATE)
+    }
+
+
+def update_preprocessor(preprocessor, X_new, category_counts=None):
+    """
+    Return a copy of a fitted preprocessor updated with a new batch
+
+    Scaler means/variances are updated with partial_fit and one-hot
+    vocabularies are extended with categories first seen in the batch
+    (appended after the existing ones). Most-frequent imputer fill values are
+    recomputed from running category counts when they are given. Median fill
+    values are deliberately left at their fitted values: an exact median
+    cannot be updated from the batch alone, and this keeps the cost
+    proportional to the batch. The hashing encoder is stateless; only its
+    collision_report_ is recomputed, on the batch, so it reflects the tokens
+    the retrained model sees.
+
+    Parameters:
+    -----------
+    preprocessor : ColumnTransformer
+        Fitted preprocessor
+    X_new : pd.DataFrame
+        New batch of features
+    category_counts : dict, optional
+        Column -> pd.Series of value counts over all training rows seen so far,
+        including this batch (as kept in the retraining state)
+
+    Returns:
+    --------
+    ColumnTransformer
+        Updated copy of the preprocessor
+    """
+    updated = copy.deepcopy(preprocessor)
+
+    for name, transformer, columns in updated.transformers_:
+        if not isinstance(transformer, Pipeline):
+            continue
+        batch = X_new[columns]
+
+        if name == 'num':
+            imputed = transformer.named_steps['imputer'].transform(batch)
+            transformer.named_steps['scaler'].partial_fit(imputed)
+
+        elif name == 'cat' and 'onehot' in transformer.named_steps:
+            imputer = transformer.named_steps['imputer']
+            if category_counts is not None and imputer.strategy == 'most_frequent':
+                for j, col in enumerate(columns):
+                    counts = category_counts.get(col)
+                    if counts is not None and len(counts):
+                        # Ties go to the smallest value, as in SimpleImputer
+                        imputer.statistics_[j] = min(counts.index[counts == counts.max()])
+
+            imputed = imputer.transform(batch)
+            ohe = transformer.named_steps['onehot']
+            categories = []
+            for j, known in enumerate(ohe.categories_):
+                seen = pd.unique(imputed[:, j])
+                new = [value for value in seen if value not in set(known)]
+                if new:
+                    print(f"New categories for '{columns[j]}': {new}")
+                categories.append(np.array(list(known) + new, dtype=known.dtype))
+
+            # Refit with explicit categories (keeping the other encoder settings)
+            # so only the batch is scanned
+            extended = clone(ohe).set_params(categories=categories).fit(imputed)
+            transformer.steps[-1] = ('onehot', extended)
+
+        elif name == 'cat' and 'hashing' in transformer.named_steps:
+            hashing = transformer.named_steps['hashing']
+            hashing.collision_report_ = hashing.collision_report(batch)
+
+    return updated
+
+
+def _reservoir_update(state, X_new, y_new):
+    """
+    Fold new training rows into the replay sample (reservoir sampling)
+
+    Keeps state['replay_X'] a uniform sample of every training row seen so far
+    without revisiting the history.
+    """
+    replay_X, replay_y = state['replay_X'], state['replay_y']
+    replay_size = state['replay_size']
+
+    # Fill any free slots directly
+    n_fill = max(0, min(replay_size - len(replay_X), len(X_new)))
+    replay_X = pd.concat([replay_X, X_new.iloc[:n_fill]])
+    replay_y = pd.concat([replay_y, y_new.iloc[:n_fill]])
+
+    # Algorithm R: row i replaces a random slot with probability replay_size / n_seen_i
+    rest = np.arange(n_fill, len(X_new))
+    n_seen = state['n_seen'] + n_fill + np.arange(1, len(rest) + 1)
+    slots = (state['rng'].random(len(rest)) * n_seen).astype(np.int64)
+    accepted = slots < replay_size
+    if accepted.any():
+        # When a slot is hit more than once the latest row wins, as in the sequential algorithm
+        chosen = pd.Series(rest[accepted], index=slots[accepted])
+        chosen = chosen[~chosen.index.duplicated(keep='last')]
+        keep = np.setdiff1d(np.arange(len(replay_X)), chosen.index.to_numpy())
+        replay_X = pd.concat([replay_X.iloc[keep], X_new.iloc[chosen.to_numpy()]])
+        replay_y = pd.concat([replay_y.iloc[keep], y_new.iloc[chosen.to_numpy()]])
+
+    state['replay_X'], state['replay_y'] = replay_X, replay_y
+    state['n_seen'] += len(X_new)
+
+
+@instrumented()
+def incremental_retrain(models, results, X_new, y_new, state,
+                        name='Logistic Regression', holdout_fraction=0.2,
+                        tolerance=0.005, max_iter=200, n_bootstrap=200, n_jobs=-1):
+    """
+    Warm-start retrain a logistic regression model on a new labeled batch
+
+    Part of the batch joins the rolling holdout; the rest, together with the
+    bounded replay sample, is used to refit the classifier starting from the
+    previous coefficients on the updated preprocessor. The new version is
+    promoted only if its holdout accuracy and ROC AUC are within tolerance of
+    the current version on the same holdout.
+
+    Both versions are kept in models/results under '<name> v<version>';
+    models[name] and results[name] always point at the promoted version.
+    A version's results keep the metrics it was created with (the test-set
+    results from train_and_evaluate_models for the first version); the latest
+    rolling-holdout comparison is stored under its 'holdout_eval' key.
+
+    Parameters:
+    -----------
+    models : dict
+        Dictionary of trained models from train_and_evaluate_models
+    results : dict
+        Dictionary of model results from train_and_evaluate_models
+    X_new : pd.DataFrame
+        New batch of features
+    y_new : pd.Series
+        New batch of labels
+    state : dict
+        Retraining state from create_retrain_state (updated in place)
+    name : str
+        Model to retrain
+    holdout_fraction : float
+        Fraction of the batch added to the rolling holdout
+    tolerance : float
+        Allowed drop in holdout accuracy/ROC AUC for promotion
+    max_iter : int
+        Iteration cap for the warm-started solver
+    n_bootstrap : int
+        Bootstrap resamples for the holdout confidence intervals
+    n_jobs : int
+        Number of worker processes for the bootstrap
+
+    Returns:
+    --------
+    models : dict
+        Updated dictionary of models
+    results : dict
+        Updated dictionary of results
+    promoted : bool
+        Whether the new version replaced the current one
+    """
+    current = models[name]
+    if not isinstance(current.named_steps['classifier'], LogisticRegression):
+        raise ValueError(f"Incremental retraining requires a LogisticRegression model, got {name}.")
+
+    # Split the batch into training rows and rows for the rolling holdout
+    n_holdout = int(round(len(X_new) * holdout_fraction))
+    order = state['rng'].permutation(len(X_new))
+    X_batch_train, y_batch_train = X_new.iloc[order[n_holdout:]], y_new.iloc[order[n_holdout:]]
+    state['holdout_X'] = pd.concat([state['holdout_X'], X_new.iloc[order[:n_holdout]]]).iloc[-state['holdout_size']:]
+    state['holdout_y'] = pd.concat([state['holdout_y'], y_new.iloc[order[:n_holdout]]]).iloc[-state['holdout_size']:]
+
+    # Update preprocessing statistics/vocabularies with the batch
+    for col, counts in state['category_counts'].items():
+        state['category_counts'][col] = counts.add(X_batch_train[col].value_counts(), fill_value=0)
+    old_preprocessor = current.named_steps['preprocessor']
+    new_preprocessor = update_preprocessor(old_preprocessor, X_batch_train,
+                                           category_counts=state['category_counts'])
+
+    # Warm start from the previous coefficients, aligned by feature name
+    old_clf = current.named_steps['classifier']
+    old_names = list(old_preprocessor.get_feature_names_out())
+    new_names = list(new_preprocessor.get_feature_names_out())
+    old_position = {feature: i for i, feature in enumerate(old_names)}
+    coef = np.zeros((1, len(new_names)))
+    for i, feature in enumerate(new_names):
+        if feature in old_position:
+            coef[0, i] = old_clf.coef_[0, old_position[feature]]
+
+    new_clf = copy.deepcopy(old_clf)
+    new_clf.set_params(warm_start=True, max_iter=max_iter)
+    new_clf.coef_ = coef
+
+    # Fit on the batch plus the replay sample so older data is not forgotten
+    X_fit = pd.concat([X_batch_train, state['replay_X']])
+    y_fit = pd.concat([y_batch_train, state['replay_y']])
+    print(f"\n=== Warm-start retraining {name} on {len(X_batch_train)} new "
+          f"+ {len(state['replay_X'])} replayed rows ===")
+    new_clf.fit(new_preprocessor.transform(X_fit), y_fit)
+
+    candidate = Pipeline(steps=[
+        ('preprocessor', new_preprocessor),
+        ('classifier', new_clf)
+    ])
+    _reservoir_update(state, X_batch_train, y_batch_train)
+
+    # Compare both versions on the same rolling holdout
+    holdout_X, holdout_y = state['holdout_X'], state['holdout_y']
+    current_eval = evaluate_classifier(holdout_y, current.predict_proba(holdout_X)[:, 1],
+                                       n_bootstrap=n_bootstrap, n_jobs=n_jobs)
+    candidate_eval = evaluate_classifier(holdout_y, candidate.predict_proba(holdout_X)[:, 1],
+                                         n_bootstrap=n_bootstrap, n_jobs=n_jobs)
+
+    promoted = all(candidate_eval[metric] >= current_eval[metric] - tolerance
+                   for metric in ['accuracy', 'roc_auc'])
+
+    version, new_version = state['version'], state['latest_version'] + 1
+    state['latest_version'] = new_version
+    current_results = results.get(f'{name} v{version}', results[name])
+    models[f'{name} v{version}'] = current
+    results[f'{name} v{version}'] = {**current_results, 'holdout_eval': current_eval,
+                                     'promoted': not promoted}
+    models[f'{name} v{new_version}'] = candidate
+    results[f'{name} v{new_version}'] = {**candidate_eval, 'holdout_eval': candidate_eval,
+                                         'promoted': promoted}
+
+    print(f"Holdout accuracy: v{version} {current_eval['accuracy']:.4f}, "
+          f"v{new_version} {candidate_eval['accuracy']:.4f}")
+    print(f"Holdout ROC AUC:  v{version} {current_eval['roc_auc']:.4f}, "
+          f"v{new_version} {candidate_eval['roc_auc']:.4f}")
+
+    if promoted:
+        print(f"Promoting {name} v{new_version}")
+        models[name] = candidate
+        results[name] = results[f'{name} v{new_version}']
+        state['version'] = new_version
+    else:
+        print(f"Keeping {name} v{version}; v{new_version} did not hold its metrics")
+        results[name] = results[f'{name} v{version}']
+
+    return models, results, promoted
+
 """# --- Feature Importance Analysis ---"""
 
 # --- Feature Importance Analysis ---
+@instrumented()
 def analyze_feature_importance(models, X, preprocessor):
     """
     Analyze feature importance for the trained models
@@ -653,27 +2063,32 @@ def analyze_feature_importance(models, X, preprocessor):
     X : pd.DataFrame
         Features dataframe
     preprocessor : ColumnTransformer
-        Data preprocessor
+        Data preprocessor; only used for models that do not carry their own
+        fitted preprocessor
     """
-    # Extract feature names after one-hot encoding
-    numerical_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
-    categorical_cols = X.select_dtypes(include=['object']).columns.tolist()
-
-    # Fit the preprocessor to get feature names
-    preprocessor.fit(X)
-
-    # Get one-hot encoder feature names
-    ohe = preprocessor.named_transformers_['cat'].named_steps['onehot']
-    categorical_features = ohe.get_feature_names_out(categorical_cols)
+    def get_feature_names(model):
+        # Read names from the preprocessor the model was actually fitted with,
+        # so columns it leaves out (e.g. a set-aside 'fnlwgt') are not listed
+        fitted = model.named_steps.get('preprocessor', preprocessor)
+        columns = {name: cols for name, _, cols in fitted.transformers_}
+
+        # Get one-hot encoder (or hashing encoder bucket) feature names
+        cat_steps = fitted.named_transformers_['cat'].named_steps
+        if 'onehot' in cat_steps:
+            categorical_features = cat_steps['onehot'].get_feature_names_out(columns['cat'])
+        else:
+            categorical_features = cat_steps['hashing'].get_feature_names_out()
+            print("Hashing encoder collision report:", cat_steps['hashing'].collision_report_)
 
-    # Combine all feature names
-    feature_names = np.concatenate([numerical_cols, categorical_features])
+        # Combine all feature names
+        return np.concatenate([list(columns['num']), categorical_features])
 
     # Extract and plot feature importance for Logistic Regression
     if 'Logistic Regression' in models:
         # Get coefficients
         log_reg = models['Logistic Regression'].named_steps['classifier']
         coefficients = log_reg.coef_[0]
+        feature_names = get_feature_names(models['Logistic Regression'])
 
         # Create DataFrame for visualization
         feature_importance = pd.DataFrame({
@@ -699,6 +2114,7 @@ def analyze_feature_importance(models, X, preprocessor):
         # Get feature importance
         dt = models['Decision Tree'].named_steps['classifier']
         importances = dt.feature_importances_
+        feature_names = get_feature_names(models['Decision Tree'])
 
         # Create DataFrame for visualization
         feature_importance = pd.DataFrame({
@@ -790,6 +2206,9 @@ To push this notebook to GitHub:
    - Implement cross-validation strategy
 """
 
+# Export per-stage timings and memory for this run
+export_metrics()
+
 print("Notebook execution completed!")
 
 